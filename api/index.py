@@ -1,36 +1,65 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request
 from flask_cors import CORS
 import os
-import json
 import time
 import random
+import hashlib
+import tempfile
+from collections import deque, namedtuple
+from contextlib import ExitStack
+from itertools import islice
 from datetime import datetime
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Annotated, Dict, List, Optional
 import threading
+import uuid
+import msgspec
+import numpy as np
+import orjson
 
 app = Flask(__name__)
 CORS(app)
 
-# Global game state storage (in production, use Redis or database)
+# Global game state storage; with REDIS_URL set this is a per-process cache
+# of the games saved in Redis.
+# game_locks guard game-wide writes (joins, phase changes, ticks); trades and
+# other player-scoped writes take that player's own "_lock" instead, and
+# readers serve the cached JSON snapshot, which is rebuilt under the game
+# lock (plus every player's lock) whenever it is stale.
 game_states: Dict[str, dict] = {}
 game_locks: Dict[str, threading.Lock] = {}
+game_tickers: Dict[str, threading.Event] = {}  # stop flags of running tickers
+_locks_lock = threading.Lock()  # guards insertion into game_states/game_locks/game_tickers
 
 # Constants
 GAME_ROUNDS = 5
 ROUND_DURATION_MS = 35000
 STARTING_CASH = 10000
 TOTAL_FRAMES = 35
+TICK_INTERVAL = 1.0
+HISTORY_LENGTH = 50
+TRANSACTION_LOG_LIMIT = 200  # entries kept inline in the game state
+# Unset means a private temp directory, created on first use (see transaction_log_dir)
+TRANSACTION_LOG_DIR = os.environ.get("TRANSACTION_LOG_DIR")
+REDIS_URL = os.environ.get("REDIS_URL")
+TICKER_LEASE_MS = 3000
+ASSET_TYPES = ["STOCK", "CRYPTO", "BOND", "ETF"]
 
-# Initial Assets Data
-INITIAL_ASSETS = [
+# Transaction log entry; encoded once by record_transaction, whose JSON bytes
+# are then kept inline as an orjson.Fragment so snapshots copy them verbatim
+TxRecord = namedtuple(
+    "TxRecord", "round type assetId assetType amount price totalValue eventActive sentimentAtTime"
+)
+
+# Initial Assets Data (read-only; games get copies via _fresh_assets)
+INITIAL_ASSETS = tuple(MappingProxyType(asset) for asset in [
     {
         "id": "AAPL",
         "name": "Apple Inc.",
         "type": "STOCK",
         "baseVolatility": 0.8,
         "trendBias": "UP",
-        "currentPrice": 150.0,
-        "history": [150.0]
+        "currentPrice": 150.0
     },
     {
         "id": "BTC",
@@ -38,8 +67,7 @@ INITIAL_ASSETS = [
         "type": "CRYPTO",
         "baseVolatility": 2.5,
         "trendBias": "SIDEWAYS",
-        "currentPrice": 45000.0,
-        "history": [45000.0]
+        "currentPrice": 45000.0
     },
     {
         "id": "GOVT",
@@ -47,8 +75,7 @@ INITIAL_ASSETS = [
         "type": "BOND",
         "baseVolatility": 0.3,
         "trendBias": "SIDEWAYS",
-        "currentPrice": 100.0,
-        "history": [100.0]
+        "currentPrice": 100.0
     },
     {
         "id": "SPY",
@@ -56,10 +83,9 @@ INITIAL_ASSETS = [
         "type": "ETF",
         "baseVolatility": 0.6,
         "trendBias": "UP",
-        "currentPrice": 400.0,
-        "history": [400.0]
+        "currentPrice": 400.0
     }
-]
+])
 
 AVATARS = [
     {
@@ -136,13 +162,128 @@ SCENARIOS = [
     }
 ]
 
+AVATARS_BY_ID = {a["id"]: a for a in AVATARS}
+STRATEGIES_BY_ID = {s["id"]: s for s in STRATEGIES}
+SCENARIOS_BY_ID = {s["id"]: s for s in SCENARIOS}
+
+# Compare-and-set of a saved game: KEYS[1] = game key, ARGV = [expected version, state].
+# Writes queued with the save follow as KEYS[i] / ARGV[i + 1] pairs and are
+# applied only if the CAS succeeds: RPUSH the value, or DEL when it is empty.
+SAVE_GAME_LUA = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if current ~= tonumber(ARGV[1]) then
+    return -1
+end
+redis.call('HSET', KEYS[1], 'version', current + 1, 'state', ARGV[2])
+for i = 2, #KEYS do
+    if ARGV[i + 1] == '' then
+        redis.call('DEL', KEYS[i])
+    else
+        redis.call('RPUSH', KEYS[i], ARGV[i + 1])
+    end
+end
+return current + 1
+"""
+
+# Acquire or renew a ticker lease: KEYS[1] = lease key, ARGV = [owner token, lease ms]
+TICKER_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+return 0
+"""
+
+# Optional shared storage so several workers/replicas can serve the same games
+redis_client = None
+if REDIS_URL:
+    import redis
+    redis_client = redis.Redis.from_url(REDIS_URL)
+    save_game_script = redis_client.register_script(SAVE_GAME_LUA)
+    ticker_lease_script = redis_client.register_script(TICKER_LEASE_LUA)
+TICKER_TOKEN = uuid.uuid4().hex  # identifies this process as a ticker lease owner
+
+PositiveFloat = Annotated[float, msgspec.Meta(gt=0)]
+
+
+# Request bodies, validated in one pass by decode_body
+class GameRequest(msgspec.Struct):
+    gameId: str = "default"
+
+
+class ResetRequest(msgspec.Struct):
+    gameId: str = "default"
+    seed: Optional[Annotated[int, msgspec.Meta(ge=0)]] = None
+
+
+class JoinRequest(msgspec.Struct):
+    name: str
+    gameId: str = "default"
+
+
+class AvatarRequest(msgspec.Struct):
+    playerId: str
+    avatarId: str
+    gameId: str = "default"
+
+
+class StrategyRequest(msgspec.Struct):
+    playerId: str
+    strategyId: str
+    gameId: str = "default"
+
+
+class TradeRequest(msgspec.Struct):
+    playerId: str
+    assetId: str
+    amount: PositiveFloat = 1.0
+    gameId: str = "default"
+
+
+class PowerUpRequest(msgspec.Struct):
+    playerId: str
+    powerUpId: str
+    gameId: str = "default"
 
-def create_new_game(game_id: str = "default") -> dict:
+
+class StaleGameState(Exception):
+    """Another replica saved the game first; the request should be retried"""
+
+
+def decode_body(model: type):
+    """Decode and validate the JSON request body (raises msgspec.DecodeError)"""
+    return msgspec.json.decode(request.get_data(), type=model)
+
+
+def _fresh_assets() -> List[dict]:
+    """Copy INITIAL_ASSETS into mutable per-game asset dicts"""
+    return [{
+        "id": a["id"],
+        "name": a["name"],
+        "type": a["type"],
+        "baseVolatility": a["baseVolatility"],
+        "trendBias": a["trendBias"],
+        "currentPrice": a["currentPrice"],
+        "_riskWeight": a["baseVolatility"] * 500
+    } for a in INITIAL_ASSETS]
+
+
+def create_new_game(game_id: str = "default", seed: Optional[int] = None) -> dict:
     """Create a new game state"""
+    assets = _fresh_assets()
+    prices = np.array([a["currentPrice"] for a in assets], dtype=np.float64)
+    history = np.empty((len(assets), HISTORY_LENGTH), dtype=np.float64)
+    history[:, 0] = prices
+    # Fresh OS entropy per game instance, so every "default" game (and every
+    # reset) gets its own market. 53 bits keeps it exact in JavaScript clients
+    if seed is None:
+        seed = np.random.SeedSequence().entropy & ((1 << 53) - 1)
     return {
         "id": game_id,
         "players": [],
-        "assets": json.loads(json.dumps(INITIAL_ASSETS)),
+        "assets": assets,
         "currentRound": 0,
         "maxRounds": GAME_ROUNDS,
         "activeEvent": None,
@@ -158,115 +299,501 @@ def create_new_game(game_id: str = "default") -> dict:
             "BOND": 0,
             "ETF": 0
         },
+        # Wall-clock epoch seconds, for clients
         "roundStartTime": None,
-        "lastUpdate": time.time()
+        "lastUpdate": time.time(),
+        "seed": seed,  # pass to /api/game/reset to replay this market
+        # Monotonic clock reading used for round timing
+        "_roundStartMonotonic": None,
+        "_json_cache": None,
+        "_version": 0,  # Redis version this state was loaded from or saved as
+        "_pending_writes": [],  # (key, value) Redis writes to apply with the next save
+        # Internal lookup indexes (stripped from API responses)
+        "_players_by_id": {},
+        "_assets_by_id": {a["id"]: a for a in assets},
+        "_asset_index": {a["id"]: i for i, a in enumerate(assets)},
+        # Struct-of-arrays market data, parallel to "assets"
+        "_prices": prices,
+        "_vols": np.array([a["baseVolatility"] for a in assets], dtype=np.float64),
+        "_risk_weights": np.array([a["_riskWeight"] for a in assets], dtype=np.float64),
+        "_type_idx": np.array([ASSET_TYPES.index(a["type"]) for a in assets], dtype=np.intp),
+        "_history": history,
+        "_history_pos": 1,
+        "_history_count": 1,
+        "_rng": np.random.default_rng(seed)
     }
 
 
 def get_game_state(game_id: str = "default") -> dict:
     """Get or create game state"""
-    if game_id not in game_states:
-        game_states[game_id] = create_new_game(game_id)
-        game_locks[game_id] = threading.Lock()
-    return game_states[game_id]
+    game_state = game_states.get(game_id)
+    if game_state is None:
+        with _locks_lock:
+            # Publish the lock before the state so callers never miss it
+            game_locks.setdefault(game_id, threading.Lock())
+            if game_id not in game_states:
+                game_states[game_id] = create_new_game(game_id)
+            game_state = game_states[game_id]
+    if redis_client is not None:
+        game_state = sync_game_state(game_id, game_state)
+    return game_state
+
+
+def sync_game_state(game_id: str, game_state: dict) -> dict:
+    """Reload a game from Redis when another replica has saved a newer version"""
+    key = f"game:{game_id}"
+    # A missing key is version 0, the same as a game that was never saved
+    version = redis_client.hget(key, "version")
+    if int(version or 0) == game_state["_version"]:
+        return game_state
+    
+    with game_locks[game_id]:
+        current = game_states[game_id]
+        version, blob = redis_client.hmget(key, "version", "state")
+        version = int(version or 0)
+        if version == current["_version"]:
+            return current
+        if blob is None:
+            # The game vanished from Redis (flush, eviction, failover to an
+            # empty replica); start over rather than wait on a version that
+            # will never come back
+            game_state = create_new_game(game_id)
+        else:
+            game_state = load_game(blob)
+        game_state["_version"] = version
+        game_states[game_id] = game_state
+    
+    if game_state["phase"] == "PLAYING":
+        start_ticker(game_id)
+    return game_state
+
+
+def dump_game(game_state: dict) -> bytes:
+    """Serialize a game for Redis"""
+    rng_state = game_state["_rng"].bit_generator.state["state"]
+    return orjson.dumps({
+        "state": game_view(game_state),
+        # PCG64 state words are 128-bit, too wide for JSON integers
+        "rng": [str(rng_state["state"]), str(rng_state["inc"])]
+    }, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def load_game(blob: bytes) -> dict:
+    """Rebuild a game state, indexes and arrays included, from dump_game output"""
+    data = orjson.loads(blob)
+    view = data["state"]
+    game_state = create_new_game(view["id"])
+    
+    histories = [asset.pop("history") for asset in view["assets"]]
+    for asset, saved in zip(game_state["assets"], view["assets"]):
+        asset["currentPrice"] = saved["currentPrice"]
+    game_state["_prices"][:] = [a["currentPrice"] for a in game_state["assets"]]
+    count = len(histories[0])
+    game_state["_history"][:, :count] = histories
+    game_state["_history_pos"] = count % HISTORY_LENGTH
+    game_state["_history_count"] = count
+    
+    for key, value in view.items():
+        if key not in ("id", "assets", "players"):
+            game_state[key] = value
+    if game_state["roundStartTime"] is not None:
+        game_state["_roundStartMonotonic"] = time.monotonic() - (time.time() - game_state["roundStartTime"])
+    
+    for saved in view["players"]:
+        player = create_player(saved["id"], saved["name"])
+        for key in ("cash", "riskScore", "totalValue", "ready", "avatarId", "strategyId"):
+            player[key] = saved[key]
+        for power_up in saved["powerUps"]:
+            player["_power_ups_by_id"][power_up["id"]]["usesLeft"] = power_up["usesLeft"]
+        for holding in saved["holdings"]:
+            player["_holdings_by_id"][holding["assetId"]] = holding
+            player["_qty"][game_state["_asset_index"][holding["assetId"]]] = holding["quantity"]
+        player["transactionLog"].extend(orjson.Fragment(orjson.dumps(entry)) for entry in saved["transactionLog"])
+        game_state["players"].append(player)
+        game_state["_players_by_id"][player["id"]] = player
+    
+    rng_state, rng_inc = data["rng"]
+    game_state["_rng"].bit_generator.state = {
+        "bit_generator": "PCG64",
+        "state": {"state": int(rng_state), "inc": int(rng_inc)},
+        "has_uint32": 0,
+        "uinteger": 0
+    }
+    return game_state
+
+
+def save_game_state(game_state: dict):
+    """Write the game to Redis unless another replica saved since we loaded it"""
+    # Queued writes go with this attempt only; if it loses, so do they
+    pending = game_state["_pending_writes"]
+    game_state["_pending_writes"] = []
+    version = save_game_script(
+        keys=[f"game:{game_state['id']}", *(key for key, _ in pending)],
+        args=[game_state["_version"], dump_game(game_state), *(value for _, value in pending)]
+    )
+    if version < 0:
+        game_state["_version"] = -1  # force a reload on next access
+        raise StaleGameState(game_state["id"])
+    game_state["_version"] = version
+
+
+def player_write_lock(game_id: str, player: dict) -> threading.Lock:
+    """Lock for player-scoped writes"""
+    # Saving to Redis snapshots the whole game, so other players must not be
+    # mid-write; fall back to the game lock in that mode
+    return game_locks[game_id] if redis_client is not None else player["_lock"]
 
 
 def create_player(player_id: str, name: str) -> dict:
     """Create a new player"""
+    power_ups = [
+        {"id": "future-glimpse", "name": "Risk Shield", "description": "-20 Risk Score", "usesLeft": 1},
+        {"id": "market-freeze", "name": "Bailout", "description": "+$1000 Cash", "usesLeft": 1}
+    ]
     return {
         "id": player_id,
         "name": name,
         "cash": STARTING_CASH,
-        "holdings": [],
         "riskScore": 0,
-        "powerUps": [
-            {"id": "future-glimpse", "name": "Risk Shield", "description": "-20 Risk Score", "usesLeft": 1},
-            {"id": "market-freeze", "name": "Bailout", "description": "+$1000 Cash", "usesLeft": 1}
-        ],
+        "powerUps": power_ups,
         "totalValue": STARTING_CASH,
         "ready": False,
-        "transactionLog": [],
+        "transactionLog": deque(maxlen=TRANSACTION_LOG_LIMIT),
         "avatarId": None,
-        "strategyId": None
+        "strategyId": None,
+        "_lock": threading.Lock(),
+        # Quantities per asset, in game asset order, for vectorized valuation
+        "_qty": np.zeros(len(INITIAL_ASSETS), dtype=np.float64),
+        "_dirty": False,
+        "_holdings_by_id": {},  # rendered as the "holdings" list by game_view
+        "_power_ups_by_id": {p["id"]: p for p in power_ups}
     }
 
 
-def calculate_risk(player: dict, assets: List[dict]) -> int:
-    """Calculate player risk score"""
-    total_risk = 0
-    total_portfolio_value = 0
-    
-    for holding in player["holdings"]:
-        asset = next((a for a in assets if a["id"] == holding["assetId"]), None)
-        if asset:
-            value = holding["quantity"] * asset["currentPrice"]
-            total_portfolio_value += value
-            total_risk += value * asset["baseVolatility"] * 500
-    
+def public_view(obj):
+    """Strip internal (underscore-prefixed) keys for API responses"""
+    if isinstance(obj, dict):
+        return {k: public_view(v) for k, v in obj.items() if not k.startswith("_")}
+    if isinstance(obj, (list, deque)):
+        return [public_view(v) for v in obj]
+    return obj
+
+
+def price_history(game_state: dict) -> List[List[float]]:
+    """Per-asset price history, oldest first"""
+    history = game_state["_history"]
+    pos = game_state["_history_pos"]
+    if game_state["_history_count"] < HISTORY_LENGTH:
+        return history[:, :pos].tolist()
+    return np.concatenate((history[:, pos:], history[:, :pos]), axis=1).tolist()
+
+
+def player_view(player: dict) -> dict:
+    """Public JSON view of a player; the caller must hold the player's lock"""
+    view = public_view(player)
+    view["holdings"] = public_view(list(player["_holdings_by_id"].values()))
+    return view
+
+
+def game_view(game_state: dict) -> dict:
+    """Public JSON view of a game state; the caller must hold the game lock"""
+    # Trades mutate players (and append to their transaction log) under the
+    # player lock alone, so hold every player's lock for a consistent copy
+    with ExitStack() as stack:
+        for player in game_state["players"]:
+            stack.enter_context(player["_lock"])
+        view = {k: [] if k == "players" else public_view(v) for k, v in game_state.items() if not k.startswith("_")}
+        view["players"] = [player_view(p) for p in game_state["players"]]
+    for asset, history in zip(view["assets"], price_history(game_state)):
+        asset["history"] = history
+    return view
+
+
+def risk_score(total_risk: float, total_portfolio_value: float, strategy_id: Optional[str]) -> int:
+    """Scale volatility-weighted portfolio risk to a 0-100 score"""
     if total_portfolio_value > 0:
-        risk_score = min(100, round(total_risk / total_portfolio_value * 100))
-        if player.get("strategyId") == "SAFETY_FIRST":
-            risk_score = max(0, risk_score - 10)
-        return risk_score
+        score = min(100, round(total_risk / total_portfolio_value * 100))
+        if strategy_id == "SAFETY_FIRST":
+            score = max(0, score - 10)
+        return score
     return 0
 
 
+def json_default(obj):
+    """orjson fallback for types it cannot serialize natively"""
+    if isinstance(obj, TxRecord):
+        return obj._asdict()
+    raise TypeError
+
+
+def json_response(obj, status: int = 200) -> Response:
+    """Serialize obj with orjson into a JSON response"""
+    return Response(
+        orjson.dumps(obj, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY), status, mimetype="application/json"
+    )
+
+
+def mark_updated(game_state: dict):
+    """Record a state change and drop the cached JSON snapshot"""
+    game_state["lastUpdate"] = time.time()
+    game_state["_json_cache"] = None
+    if redis_client is not None:
+        save_game_state(game_state)
+
+
+def transaction_log_dir() -> str:
+    """Directory for history files"""
+    # Per process unless configured, since player ids repeat across instances
+    # and a shared directory would interleave their histories
+    global TRANSACTION_LOG_DIR
+    if TRANSACTION_LOG_DIR is None:
+        with _locks_lock:
+            if TRANSACTION_LOG_DIR is None:
+                TRANSACTION_LOG_DIR = tempfile.mkdtemp(prefix="bull-bear-transactions-")
+    return TRANSACTION_LOG_DIR
+
+
+def transaction_log_path(game_id: str, player_id: str) -> str:
+    """Path of a player's full transaction history (ids hashed for a safe filename)"""
+    digest = hashlib.sha1(f"{game_id}\0{player_id}".encode()).hexdigest()
+    return os.path.join(transaction_log_dir(), f"{digest}.jsonl")
+
+
+def transaction_log_key(game_id: str, player_id: str) -> str:
+    """Redis list holding a player's full transaction history"""
+    return f"game:{game_id}:transactions:{player_id}"
+
+
+def record_transaction(game_state: dict, player: dict, entry: TxRecord):
+    """Append to the player's recent log and full history"""
+    line = orjson.dumps(entry, default=json_default)
+    player["transactionLog"].append(orjson.Fragment(line))
+    if redis_client is not None:
+        # Pushed by the next save, so a lost CAS leaves no orphan entry
+        game_state["_pending_writes"].append((transaction_log_key(game_state["id"], player["id"]), line))
+        return
+    # Opened per write so idle and finished games hold no file descriptors
+    os.makedirs(transaction_log_dir(), exist_ok=True)
+    with open(transaction_log_path(game_state["id"], player["id"]), "ab") as f:
+        f.write(line + b"\n")
+
+
+def discard_transaction_log(game_state: dict, player: dict):
+    """Delete the player's full history (on reset, where player ids can recur,
+    and once the game finishes)"""
+    if redis_client is not None:
+        # Deleted by the next save, alongside the state it belongs to
+        game_state["_pending_writes"].append((transaction_log_key(game_state["id"], player["id"]), b""))
+        return
+    try:
+        os.remove(transaction_log_path(game_state["id"], player["id"]))
+    except FileNotFoundError:
+        pass
+
+
+def refresh_state_json(game_state: dict) -> bytes:
+    """Rebuild the cached snapshot if stale; the caller must hold the game lock"""
+    cache = game_state["_json_cache"]
+    if cache is None or cache[0] != game_state["lastUpdate"]:
+        view = game_view(game_state)
+        # Keyed by the lastUpdate captured with the snapshot, so a write that
+        # lands while serializing still invalidates it
+        cache = (view["lastUpdate"], orjson.dumps(view, default=json_default, option=orjson.OPT_SERIALIZE_NUMPY))
+        game_state["_json_cache"] = cache
+    return cache[1]
+
+
+def state_json(game_state: dict) -> bytes:
+    """Serialized game view, rebuilt only when lastUpdate advances"""
+    cache = game_state["_json_cache"]
+    if cache is not None and cache[0] == game_state["lastUpdate"]:
+        return cache[1]
+    with game_locks[game_state["id"]]:
+        return refresh_state_json(game_state)
+
+
+def state_response(game_state: dict) -> Response:
+    """JSON response carrying the cached game state"""
+    return Response(state_json(game_state), mimetype="application/json")
+
+
 def update_prices(game_state: dict):
     """Update asset prices based on market conditions"""
-    for asset in game_state["assets"]:
-        change = 0
-        
-        # News impact
-        if game_state["activeEvent"] and game_state["activeEvent"].get("impact"):
-            impact = game_state["activeEvent"]["impact"].get(asset["type"], 0)
-            if impact != 0:
-                change += impact / TOTAL_FRAMES
-        
-        # Volatility
-        vol_multiplier = 1.0
-        if game_state["activeEvent"] and game_state["activeEvent"].get("volatility_multiplier"):
-            vol_multiplier = game_state["activeEvent"]["volatility_multiplier"]
-        
-        random_movement = (random.random() - 0.5) * 0.015 * asset["baseVolatility"] * vol_multiplier
-        change += random_movement
-        
-        # Sentiment drift
-        sentiment = game_state["sentiment"][asset["type"]]
-        sentiment_drift = (sentiment / 100) * (0.05 / TOTAL_FRAMES)
-        change += sentiment_drift
-        
-        # Apply update
-        asset["currentPrice"] = asset["currentPrice"] * (1 + change)
-        asset["history"].append(asset["currentPrice"])
-        if len(asset["history"]) > 50:
-            asset["history"].pop(0)
-    
-    # Update player total values
-    for player in game_state["players"]:
-        holdings_value = 0
-        for holding in player["holdings"]:
-            asset = next((a for a in game_state["assets"] if a["id"] == holding["assetId"]), None)
-            if asset:
-                holdings_value += holding["quantity"] * asset["currentPrice"]
-        player["totalValue"] = player["cash"] + holdings_value
-        player["riskScore"] = calculate_risk(player, game_state["assets"])
+    assets = game_state["assets"]
+    event = game_state["activeEvent"]
+    prices = game_state["_prices"]
+    
+    # Volatility
+    vol_multiplier = (event.get("volatility_multiplier") if event else None) or 1.0
+    change = (game_state["_rng"].random(len(assets)) - 0.5) * (0.015 * vol_multiplier) * game_state["_vols"]
+    
+    # Sentiment drift (skipped while the market is neutral)
+    if any(game_state["sentiment"].values()):
+        sentiment = np.array([game_state["sentiment"][t] for t in ASSET_TYPES], dtype=np.float64)
+        change += sentiment[game_state["_type_idx"]] * (0.05 / (100 * TOTAL_FRAMES))
+    
+    # News impact
+    impact = event.get("impact") if event else None
+    if impact:
+        change += np.array([impact.get(a["type"], 0) for a in assets], dtype=np.float64) / TOTAL_FRAMES
+    
+    # Apply update
+    prices *= 1 + change
+    pos = game_state["_history_pos"]
+    game_state["_history"][:, pos] = prices
+    game_state["_history_pos"] = (pos + 1) % HISTORY_LENGTH
+    game_state["_history_count"] = min(game_state["_history_count"] + 1, HISTORY_LENGTH)
+    for asset, price in zip(assets, prices.tolist()):
+        asset["currentPrice"] = price
+    
+    if not game_state["players"]:
+        return
+    
+    # Update player total values; players without holdings only need a
+    # refresh after they trade or their cash changes
+    players = [p for p in game_state["players"] if p["_dirty"] or p["_holdings_by_id"]]
+    if not players:
+        return
+    
+    with ExitStack() as stack:
+        for player in players:
+            stack.enter_context(player["_lock"])
+        quantities = np.stack([p["_qty"] for p in players])
+        holdings_values = np.einsum('ph,h->p', quantities, prices)
+        risk_values = np.einsum('ph,h->p', quantities, prices * game_state["_risk_weights"])
+        for player, holdings_value, total_risk in zip(players, holdings_values.tolist(), risk_values.tolist()):
+            player["totalValue"] = player["cash"] + holdings_value
+            player["riskScore"] = risk_score(total_risk, holdings_value, player.get("strategyId"))
+            player["_dirty"] = False
+
+
+def advance_one_tick(game_state: dict):
+    """Advance the round clock and market by one tick"""
+    elapsed = time.monotonic() - game_state["_roundStartMonotonic"]
+    time_remaining = max(0, TOTAL_FRAMES - int(elapsed))
+    game_state["timeRemaining"] = time_remaining
+    
+    # Update prices if market is active (after news phase)
+    if time_remaining < 30:
+        update_prices(game_state)
+    
+    # Check if round ended
+    if time_remaining <= 0:
+        if game_state["currentRound"] < game_state["maxRounds"]:
+            game_state["currentRound"] += 1
+            game_state["roundStartTime"] = time.time()
+            game_state["_roundStartMonotonic"] = time.monotonic()
+            game_state["timeRemaining"] = TOTAL_FRAMES
+        else:
+            game_state["phase"] = "FINISHED"
+            game_state["roundStartTime"] = None
+            game_state["_roundStartMonotonic"] = None
+            for player in game_state["players"]:
+                discard_transaction_log(game_state, player)
+    
+    mark_updated(game_state)
+
+
+def holds_ticker_lease(game_id: str) -> bool:
+    """Whether this process should tick the game (only one replica may)"""
+    if redis_client is None:
+        return True
+    return bool(ticker_lease_script(keys=[f"game:{game_id}:ticker"], args=[TICKER_TOKEN, TICKER_LEASE_MS]))
+
+
+def run_ticker(game_id: str, stop: threading.Event):
+    """Tick a game once per TICK_INTERVAL until it finishes or is reset"""
+    try:
+        while not stop.wait(TICK_INTERVAL):
+            try:
+                if not holds_ticker_lease(game_id):
+                    continue
+                get_game_state(game_id)  # pick up writes from other replicas
+                with game_locks[game_id]:
+                    game_state = game_states[game_id]
+                    if stop.is_set() or game_state["phase"] != "PLAYING":
+                        break
+                    try:
+                        advance_one_tick(game_state)
+                    except StaleGameState:
+                        continue  # reloaded on the next tick
+                    # Prebuild the snapshot so pollers read a consistent tick lock-free
+                    refresh_state_json(game_state)
+            except Exception:
+                # A failed tick (e.g. Redis unreachable) must not strand the
+                # game in PLAYING with no ticker; retry on the next interval
+                app.logger.exception("Tick failed for game %s", game_id)
+    finally:
+        with _locks_lock:
+            if game_tickers.get(game_id) is stop:
+                del game_tickers[game_id]
+
+
+def start_ticker(game_id: str):
+    """Spawn the background simulation thread for a game, unless one is running"""
+    with _locks_lock:
+        if game_id in game_tickers:
+            return
+        stop = game_tickers[game_id] = threading.Event()
+    thread = threading.Thread(target=run_ticker, args=(game_id, stop), name=f"ticker-{game_id}", daemon=True)
+    thread.start()
+
+
+def catch_up(game_id: str, game_state: dict) -> dict:
+    """Tick a game whose ticker has stalled, e.g. on a serverless instance
+    that is frozen between requests"""
+    if game_state["phase"] != "PLAYING" or game_state["roundStartTime"] is None:
+        return game_state
+    # A live ticker keeps timeRemaining within about a tick of the wall clock
+    elapsed = time.time() - game_state["roundStartTime"]
+    if game_state["timeRemaining"] - (TOTAL_FRAMES - elapsed) < 3 or not holds_ticker_lease(game_id):
+        return game_state
+    with game_locks[game_id]:
+        game_state = game_states[game_id]
+        if game_state["phase"] == "PLAYING":
+            try:
+                advance_one_tick(game_state)
+            except StaleGameState:
+                pass  # another replica ticked; serve what we have
+    start_ticker(game_id)  # respawn it if the thread is gone
+    return game_state
+
+
+def stop_ticker(game_id: str):
+    """Stop the game's simulation thread, if any"""
+    with _locks_lock:
+        stop = game_tickers.pop(game_id, None)
+    if stop is not None:
+        stop.set()
+
+
+@app.errorhandler(msgspec.DecodeError)
+def invalid_body(error):
+    """Malformed or invalid request body"""
+    return json_response({"error": str(error)}, 400)
+
+
+@app.errorhandler(StaleGameState)
+def stale_game_state(error):
+    """Another replica won a concurrent write"""
+    return json_response({"error": "Game state changed, please retry"}, 409)
 
 
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({"status": "ok", "timestamp": time.time()})
+    return json_response({"status": "ok", "timestamp": time.time()})
 
 
 @app.route('/api/game/join', methods=['POST'])
 def join_game():
     """Join a game"""
-    data = request.json
-    name = data.get('name')
-    game_id = data.get('gameId', 'default')
+    req = decode_body(JoinRequest)
+    name = req.name
+    game_id = req.gameId
     
     if not name:
-        return jsonify({"error": "Name is required"}), 400
+        return json_response({"error": "Name is required"}, 400)
     
     game_state = get_game_state(game_id)
     
@@ -280,13 +807,14 @@ def join_game():
             player_id = f"player-{len(game_state['players'])}-{int(time.time())}"
             new_player = create_player(player_id, name)
             game_state["players"].append(new_player)
+            game_state["_players_by_id"][player_id] = new_player
         
-        game_state["lastUpdate"] = time.time()
+        mark_updated(game_state)
     
-    return jsonify({
+    return json_response({
         "playerId": player_id,
         "gameId": game_id,
-        "gameState": game_state
+        "gameState": orjson.Fragment(state_json(game_state))
     })
 
 
@@ -294,37 +822,15 @@ def join_game():
 def get_state():
     """Get current game state"""
     game_id = request.args.get('gameId', 'default')
-    game_state = get_game_state(game_id)
-    
-    # Auto-update if in PLAYING phase
-    if game_state["phase"] == "PLAYING" and game_state["roundStartTime"]:
-        elapsed = time.time() - game_state["roundStartTime"]
-        time_remaining = max(0, TOTAL_FRAMES - int(elapsed))
-        game_state["timeRemaining"] = time_remaining
-        
-        # Update prices if market is active (after news phase)
-        if time_remaining < 30:
-            update_prices(game_state)
-        
-        # Check if round ended
-        if time_remaining <= 0:
-            with game_locks[game_id]:
-                if game_state["currentRound"] < game_state["maxRounds"]:
-                    game_state["currentRound"] += 1
-                    game_state["roundStartTime"] = time.time()
-                    game_state["timeRemaining"] = TOTAL_FRAMES
-                else:
-                    game_state["phase"] = "FINISHED"
-                    game_state["roundStartTime"] = None
-    
-    return jsonify(game_state)
+    game_state = catch_up(game_id, get_game_state(game_id))
+    return state_response(game_state)
 
 
 @app.route('/api/game/start', methods=['POST'])
 def start_game():
     """Start the game"""
-    data = request.json
-    game_id = data.get('gameId', 'default')
+    req = decode_body(GameRequest)
+    game_id = req.gameId
     
     game_state = get_game_state(game_id)
     
@@ -334,170 +840,191 @@ def start_game():
             game_state["phase"] = "PLAYING"
             game_state["currentRound"] = 1
             game_state["roundStartTime"] = time.time()
+            game_state["_roundStartMonotonic"] = time.monotonic()
             game_state["timeRemaining"] = TOTAL_FRAMES
             
             # Pick random scenario
             game_state["activeScenario"] = random.choice(SCENARIOS)
             
-            game_state["lastUpdate"] = time.time()
+            mark_updated(game_state)
+            start_ticker(game_id)
     
-    return jsonify(game_state)
+    return state_response(game_state)
 
 
 @app.route('/api/game/avatar', methods=['POST'])
 def select_avatar():
     """Select avatar"""
-    data = request.json
-    player_id = data.get('playerId')
-    avatar_id = data.get('avatarId')
-    game_id = data.get('gameId', 'default')
+    req = decode_body(AvatarRequest)
+    player_id = req.playerId
+    avatar_id = req.avatarId
+    game_id = req.gameId
+    
+    if avatar_id not in AVATARS_BY_ID:
+        return json_response({"error": "Invalid avatar"}, 400)
     
     game_state = get_game_state(game_id)
     
-    with game_locks[game_id]:
-        player = next((p for p in game_state["players"] if p["id"] == player_id), None)
-        if player:
+    player = game_state["_players_by_id"].get(player_id)
+    if player:
+        with player_write_lock(game_id, player):
             player["avatarId"] = avatar_id
-            game_state["lastUpdate"] = time.time()
+            mark_updated(game_state)
     
-    return jsonify(game_state)
+    return state_response(game_state)
 
 
 @app.route('/api/game/strategy', methods=['POST'])
 def select_strategy():
     """Select strategy"""
-    data = request.json
-    player_id = data.get('playerId')
-    strategy_id = data.get('strategyId')
-    game_id = data.get('gameId', 'default')
+    req = decode_body(StrategyRequest)
+    player_id = req.playerId
+    strategy_id = req.strategyId
+    game_id = req.gameId
+    
+    if strategy_id not in STRATEGIES_BY_ID:
+        return json_response({"error": "Invalid strategy"}, 400)
     
     game_state = get_game_state(game_id)
     
-    with game_locks[game_id]:
-        player = next((p for p in game_state["players"] if p["id"] == player_id), None)
-        if player:
+    player = game_state["_players_by_id"].get(player_id)
+    if player:
+        with player_write_lock(game_id, player):
             player["strategyId"] = strategy_id
-            game_state["lastUpdate"] = time.time()
+            mark_updated(game_state)
     
-    return jsonify(game_state)
+    return state_response(game_state)
 
 
 @app.route('/api/game/buy', methods=['POST'])
 def buy_asset():
     """Buy an asset"""
-    data = request.json
-    player_id = data.get('playerId')
-    asset_id = data.get('assetId')
-    amount = data.get('amount', 1)
-    game_id = data.get('gameId', 'default')
+    req = decode_body(TradeRequest)
+    player_id = req.playerId
+    asset_id = req.assetId
+    amount = req.amount
+    game_id = req.gameId
     
     game_state = get_game_state(game_id)
     
-    with game_locks[game_id]:
-        player = next((p for p in game_state["players"] if p["id"] == player_id), None)
-        asset = next((a for a in game_state["assets"] if a["id"] == asset_id), None)
-        
-        if not player or not asset or game_state["phase"] != "PLAYING":
-            return jsonify({"error": "Invalid request"}), 400
-        
-        cost = amount * asset["currentPrice"]
+    player = game_state["_players_by_id"].get(player_id)
+    asset = game_state["_assets_by_id"].get(asset_id)
+    
+    if not player or not asset or game_state["phase"] != "PLAYING":
+        return json_response({"error": "Invalid request"}, 400)
+    
+    # Trades only touch this player's cash and holdings; asset prices are
+    # written by the ticker alone, so the game lock is not needed here
+    with player_write_lock(game_id, player):
+        # Read once: the ticker may reprice the asset mid-trade
+        price = asset["currentPrice"]
+        cost = amount * price
         if player["cash"] >= cost:
             player["cash"] -= cost
             
-            holding = next((h for h in player["holdings"] if h["assetId"] == asset_id), None)
+            holding = player["_holdings_by_id"].get(asset_id)
             if holding:
                 total_cost = (holding["quantity"] * holding["avgBuyPrice"]) + cost
                 holding["quantity"] += amount
                 holding["avgBuyPrice"] = total_cost / holding["quantity"]
             else:
-                player["holdings"].append({
+                holding = {
                     "assetId": asset_id,
                     "quantity": amount,
-                    "avgBuyPrice": asset["currentPrice"]
-                })
+                    "avgBuyPrice": price
+                }
+                player["_holdings_by_id"][asset_id] = holding
+            player["_qty"][game_state["_asset_index"][asset_id]] += amount
+            player["_dirty"] = True
             
-            player["transactionLog"].append({
-                "round": game_state["currentRound"],
-                "type": "BUY",
-                "assetId": asset_id,
-                "assetType": asset["type"],
-                "amount": amount,
-                "price": asset["currentPrice"],
-                "totalValue": cost,
-                "eventActive": game_state["activeEvent"]["id"] if game_state["activeEvent"] else None,
-                "sentimentAtTime": game_state["sentiment"][asset["type"]]
-            })
+            record_transaction(game_state, player, TxRecord(
+                round=game_state["currentRound"],
+                type="BUY",
+                assetId=asset_id,
+                assetType=asset["type"],
+                amount=amount,
+                price=price,
+                totalValue=cost,
+                eventActive=game_state["activeEvent"]["id"] if game_state["activeEvent"] else None,
+                sentimentAtTime=game_state["sentiment"][asset["type"]]
+            ))
             
-            game_state["lastUpdate"] = time.time()
-            return jsonify({"success": True, "gameState": game_state})
+            mark_updated(game_state)
         else:
-            return jsonify({"error": "Insufficient funds"}), 400
+            return json_response({"error": "Insufficient funds"}, 400)
+    
+    # Built outside the player lock: the snapshot takes every player's lock
+    return json_response({"success": True, "gameState": orjson.Fragment(state_json(game_state))})
 
 
 @app.route('/api/game/sell', methods=['POST'])
 def sell_asset():
     """Sell an asset"""
-    data = request.json
-    player_id = data.get('playerId')
-    asset_id = data.get('assetId')
-    amount = data.get('amount', 1)
-    game_id = data.get('gameId', 'default')
+    req = decode_body(TradeRequest)
+    player_id = req.playerId
+    asset_id = req.assetId
+    amount = req.amount
+    game_id = req.gameId
     
     game_state = get_game_state(game_id)
     
-    with game_locks[game_id]:
-        player = next((p for p in game_state["players"] if p["id"] == player_id), None)
-        asset = next((a for a in game_state["assets"] if a["id"] == asset_id), None)
-        
-        if not player or not asset or game_state["phase"] != "PLAYING":
-            return jsonify({"error": "Invalid request"}), 400
-        
-        holding = next((h for h in player["holdings"] if h["assetId"] == asset_id), None)
+    player = game_state["_players_by_id"].get(player_id)
+    asset = game_state["_assets_by_id"].get(asset_id)
+    
+    if not player or not asset or game_state["phase"] != "PLAYING":
+        return json_response({"error": "Invalid request"}, 400)
+    
+    with player_write_lock(game_id, player):
+        price = asset["currentPrice"]
+        holding = player["_holdings_by_id"].get(asset_id)
         if holding and holding["quantity"] >= amount:
-            revenue = amount * asset["currentPrice"]
+            revenue = amount * price
             player["cash"] += revenue
             holding["quantity"] -= amount
+            player["_qty"][game_state["_asset_index"][asset_id]] -= amount
+            player["_dirty"] = True
             
             if holding["quantity"] <= 0:
-                player["holdings"] = [h for h in player["holdings"] if h["assetId"] != asset_id]
+                del player["_holdings_by_id"][asset_id]
             
-            player["transactionLog"].append({
-                "round": game_state["currentRound"],
-                "type": "SELL",
-                "assetId": asset_id,
-                "assetType": asset["type"],
-                "amount": amount,
-                "price": asset["currentPrice"],
-                "totalValue": revenue,
-                "eventActive": game_state["activeEvent"]["id"] if game_state["activeEvent"] else None,
-                "sentimentAtTime": game_state["sentiment"][asset["type"]]
-            })
+            record_transaction(game_state, player, TxRecord(
+                round=game_state["currentRound"],
+                type="SELL",
+                assetId=asset_id,
+                assetType=asset["type"],
+                amount=amount,
+                price=price,
+                totalValue=revenue,
+                eventActive=game_state["activeEvent"]["id"] if game_state["activeEvent"] else None,
+                sentimentAtTime=game_state["sentiment"][asset["type"]]
+            ))
             
-            game_state["lastUpdate"] = time.time()
-            return jsonify({"success": True, "gameState": game_state})
+            mark_updated(game_state)
         else:
-            return jsonify({"error": "Insufficient holdings"}), 400
+            return json_response({"error": "Insufficient holdings"}, 400)
+    
+    return json_response({"success": True, "gameState": orjson.Fragment(state_json(game_state))})
 
 
 @app.route('/api/game/powerup', methods=['POST'])
 def use_powerup():
     """Use a power-up"""
-    data = request.json
-    player_id = data.get('playerId')
-    powerup_id = data.get('powerUpId')
-    game_id = data.get('gameId', 'default')
+    req = decode_body(PowerUpRequest)
+    player_id = req.playerId
+    powerup_id = req.powerUpId
+    game_id = req.gameId
     
     game_state = get_game_state(game_id)
     
-    with game_locks[game_id]:
-        player = next((p for p in game_state["players"] if p["id"] == player_id), None)
-        
-        if not player:
-            return jsonify({"error": "Player not found"}), 404
-        
-        powerup = next((p for p in player["powerUps"] if p["id"] == powerup_id), None)
+    player = game_state["_players_by_id"].get(player_id)
+    
+    if not player:
+        return json_response({"error": "Player not found"}, 404)
+    
+    with player_write_lock(game_id, player):
+        powerup = player["_power_ups_by_id"].get(powerup_id)
         if not powerup or powerup["usesLeft"] <= 0:
-            return jsonify({"error": "Power-up not available"}), 400
+            return json_response({"error": "Power-up not available"}, 400)
         
         powerup["usesLeft"] -= 1
         
@@ -505,22 +1032,62 @@ def use_powerup():
             player["riskScore"] = max(0, player["riskScore"] - 20)
         elif powerup_id == "market-freeze":
             player["cash"] += 1000
+            player["_dirty"] = True
         
-        game_state["lastUpdate"] = time.time()
+        mark_updated(game_state)
+    
+    return json_response({"success": True, "gameState": orjson.Fragment(state_json(game_state))})
+
+
+@app.route('/api/game/player/<player_id>/transactions', methods=['GET'])
+def get_transactions(player_id: str):
+    """Get a player's full transaction history"""
+    game_id = request.args.get('gameId', 'default')
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = request.args.get('limit', type=int)
     
-    return jsonify({"success": True, "gameState": game_state})
+    game_state = get_game_state(game_id)
+    player = game_state["_players_by_id"].get(player_id)
+    
+    if not player:
+        return json_response({"error": "Player not found"}, 404)
+    
+    stop = offset + limit if limit is not None and limit >= 0 else None
+    if redis_client is not None:
+        lines = [] if stop == offset else redis_client.lrange(
+            transaction_log_key(game_id, player_id), offset, -1 if stop is None else stop - 1
+        )
+    else:
+        with player["_lock"]:
+            try:
+                with open(transaction_log_path(game_id, player_id), "rb") as f:
+                    lines = list(islice(f, offset, stop))
+            except FileNotFoundError:
+                lines = []
+    transactions = [orjson.Fragment(line) for line in lines]
+    
+    return json_response({"offset": offset, "transactions": transactions})
 
 
 @app.route('/api/game/reset', methods=['POST'])
 def reset_game():
     """Reset/restart the game"""
-    data = request.json
-    game_id = data.get('gameId', 'default')
+    req = decode_body(ResetRequest)
+    game_id = req.gameId
     
-    with game_locks.get(game_id, threading.Lock()):
-        game_states[game_id] = create_new_game(game_id)
+    get_game_state(game_id)
+    stop_ticker(game_id)
     
-    return jsonify(game_states[game_id])
+    with game_locks[game_id]:
+        old_state = game_states[game_id]
+        game_state = create_new_game(game_id, req.seed)
+        game_state["_version"] = old_state["_version"]
+        for player in old_state["players"]:
+            discard_transaction_log(game_state, player)
+        game_states[game_id] = game_state
+        mark_updated(game_state)
+    
+    return state_response(game_state)
 
 
 @app.route('/api/game/results', methods=['GET'])
@@ -530,30 +1097,36 @@ def get_results():
     game_state = get_game_state(game_id)
     
     if game_state["phase"] != "FINISHED":
-        return jsonify({"error": "Game not finished"}), 400
+        return json_response({"error": "Game not finished"}, 400)
+    
+    players = game_state["players"]
+    if not players:
+        return json_response([])
+    
+    final_values = np.array([p["totalValue"] for p in players], dtype=np.float64)
+    risk_scores = np.array([p["riskScore"] for p in players], dtype=np.float64)
+    
+    # Strategy bonus
+    diversifiers = np.array([p.get("strategyId") == "DIVERSIFIER" for p in players])
+    unique_assets = np.count_nonzero(np.stack([p["_qty"] for p in players]) > 0, axis=1)
+    final_values[diversifiers & (unique_assets >= 4)] *= 1.05
+    
+    rois = (final_values - STARTING_CASH) * (100.0 / STARTING_CASH)
+    risk_adjusted_scores = rois - risk_scores * 0.5
     
+    # Rank by risk-adjusted score (stable, so ties keep join order)
+    order = np.argsort(-risk_adjusted_scores, kind="stable")
     results = []
-    for player in game_state["players"]:
-        initial_value = STARTING_CASH
-        final_value = player["totalValue"]
-        
-        # Strategy bonus
-        if player.get("strategyId") == "DIVERSIFIER":
-            unique_assets = len(set(h["assetId"] for h in player["holdings"]))
-            if unique_assets >= 4:
-                final_value += final_value * 0.05
-        
-        roi = ((final_value - initial_value) / initial_value) * 100
-        risk_adjusted_score = roi - (player["riskScore"] * 0.5)
-        
+    for rank, i in enumerate(order.tolist(), start=1):
+        player = players[i]
         results.append({
             "playerId": player["id"],
             "playerName": player["name"],
-            "finalValue": final_value,
+            "finalValue": final_values[i].item(),
             "riskScore": player["riskScore"],
-            "roi": roi,
-            "riskAdjustedScore": risk_adjusted_score,
-            "rank": 0,
+            "roi": rois[i].item(),
+            "riskAdjustedScore": risk_adjusted_scores[i].item(),
+            "rank": rank,
             "insights": ["Great job!", "Keep learning!"],
             "playerSummary": {
                 "whatYouDidWell": ["You participated actively"],
@@ -563,13 +1136,9 @@ def get_results():
             "learningCards": []
         })
     
-    # Sort by risk-adjusted score
-    results.sort(key=lambda x: x["riskAdjustedScore"], reverse=True)
-    for i, result in enumerate(results):
-        result["rank"] = i + 1
-    
-    return jsonify(results)
+    return json_response(results)
 
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    # Local development only; production runs under gunicorn (see wsgi.py)
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1", port=5000)
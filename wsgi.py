@@ -0,0 +1,8 @@
+"""WSGI entry point for running the API outside Vercel.
+
+Without REDIS_URL, run a single worker so the in-process game state stays
+canonical:
+
+    gunicorn -k gthread -w 1 --threads 8 wsgi:application
+"""
+from api.index import app as application